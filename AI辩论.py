@@ -8,19 +8,25 @@ Original file is located at
 """
 
 !pip install deepseek
+!pip install "httpx[http2]"
 
 import os
-import requests
+import httpx
 from openai import OpenAI
 from IPython.display import Markdown, display
 
 os.environ["OPENAI_API_KEY"] = ""
 os.environ["DEEPSEEK_API_KEY"] = ""
 
-openai_client = OpenAI()
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=10)
+
+openai_client = OpenAI(http_client=httpx.Client(http2=True, limits=HTTP_LIMITS))
 
 DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
 
+# 复用同一个 HTTP/2 会话，避免每轮都重新握手
+_ds_session = httpx.Client(http2=True, limits=HTTP_LIMITS, headers={"Content-Type": "application/json"})
+
 gpt_model = "gpt-4o-mini"
 deepseek_model = "deepseek-chat"
 
@@ -41,7 +47,6 @@ deepseek_messages = ["我认为留学德国的中国留学生应该留在德国
 
 def call_deepseek(messages):
     headers = {
-        "Content-Type": "application/json",
         "Authorization": f"Bearer {os.environ['DEEPSEEK_API_KEY']}"
     }
     body = {
@@ -49,7 +54,7 @@ def call_deepseek(messages):
         "messages": messages
     }
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=body)
+        response = _ds_session.post(DEEPSEEK_API_URL, headers=headers, json=body, timeout=60)
         response.raise_for_status()
         data = response.json()
         return data["choices"][0]["message"]["content"]
@@ -1,12 +1,39 @@
+import asyncio
+import importlib.util
 import os
+import threading
+import uuid
+from functools import lru_cache
 import gradio as gr
-import requests
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 
 # DeepSeek API URL
 DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
 
-def call_deepseek(api_key, model, system, messages):
+# 两家服务商各自共享一个 HTTP/2 连接池，多轮辩论复用同一条连接
+# HTTP/2 需要安装 httpx[http2]，没装 h2 时退回 HTTP/1.1
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=10)
+deepseek_http_client = httpx.AsyncClient(http2=HTTP2_ENABLED, limits=HTTP_LIMITS)
+openai_http_client = httpx.AsyncClient(http2=HTTP2_ENABLED, limits=HTTP_LIMITS)
+
+# 所有模型请求都在同一个后台事件循环里执行，多场辩论共享上面的连接池
+llm_loop = asyncio.new_event_loop()
+threading.Thread(target=llm_loop.run_forever, daemon=True).start()
+
+def run_on_llm_loop(*coros):
+    """把协程并发提交到后台事件循环，阻塞等待全部结果"""
+    async def gather():
+        return await asyncio.gather(*coros)
+    return asyncio.run_coroutine_threadsafe(gather(), llm_loop).result()
+
+@lru_cache(maxsize=8)
+def _get_openai_client(api_key):
+    # 同一个 API Key 只创建一次客户端
+    return AsyncOpenAI(api_key=api_key, http_client=openai_http_client)
+
+async def call_deepseek(api_key, model, system, messages):
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
@@ -16,19 +43,21 @@ def call_deepseek(api_key, model, system, messages):
         "messages": messages
     }
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=body)
+        response = await deepseek_http_client.post(DEEPSEEK_API_URL, headers=headers, json=body, timeout=60)
         response.raise_for_status()
         data = response.json()
         return data["choices"][0]["message"]["content"]
     except Exception as e:
         return f"[DeepSeek 出错: {e}]"
 
-def call_gpt(api_key, model, system, messages):
+async def call_gpt(api_key, model, system, messages, cache_key=None):
     try:
-        client = OpenAI(api_key=api_key)
-        chat_completion = client.chat.completions.create(
+        client = _get_openai_client(api_key)
+        chat_completion = await client.chat.completions.create(
             model=model,
-            messages=messages
+            messages=messages,
+            # 同一场辩论用同一个 key，让 OpenAI 命中前缀缓存
+            extra_body={"prompt_cache_key": cache_key} if cache_key else None
         )
         return chat_completion.choices[0].message.content
     except Exception as e:
@@ -45,37 +74,45 @@ def start_debate(
     deepseek_first_statement,
     num_rounds
 ):
-    # 初始化对话消息
-    gpt_messages = [gpt_first_statement]
-    deepseek_messages = [deepseek_first_statement]
+    # 初始化对话历史，之后每轮只追加新发言
+    # 历史前缀保持不变，OpenAI 和 DeepSeek 都能复用服务端的上下文缓存
+    session_id = uuid.uuid4().hex
+    gpt_history = [
+        {"role": "system", "content": gpt_system},
+        {"role": "assistant", "content": gpt_first_statement},
+        {"role": "user", "content": deepseek_first_statement}
+    ]
+    deepseek_history = [
+        {"role": "system", "content": deepseek_system},
+        {"role": "assistant", "content": deepseek_first_statement},
+        {"role": "user", "content": gpt_first_statement}
+    ]
 
     # 输出结果收集器
     conversation_md = []
     conversation_md.append(f"**G老师:** {gpt_first_statement}")
     conversation_md.append(f"**Deep老师:** {deepseek_first_statement}")
+    yield "\n\n".join(conversation_md)
 
     for i in range(num_rounds):
+        # 同一轮里双方都只回应对方上一轮的发言，所以两次调用可以并发
+        gpt_next, deepseek_next = run_on_llm_loop(
+            call_gpt(gpt_api_key, gpt_model, gpt_system, gpt_history, cache_key=session_id),
+            call_deepseek(deepseek_api_key, deepseek_model, deepseek_system, deepseek_history)
+        )
 
-        gpt_history = [{"role": "system", "content": gpt_system}]
-        for gpt, deepseek in zip(gpt_messages, deepseek_messages):
-            gpt_history.append({"role": "assistant", "content": gpt})
-            gpt_history.append({"role": "user", "content": deepseek})
-        gpt_next = call_gpt(gpt_api_key, gpt_model, gpt_system, gpt_history)
-        gpt_messages.append(gpt_next)
-        conversation_md.append(f"**GPT:** {gpt_next}")
-
-
-        deepseek_history = [{"role": "system", "content": deepseek_system}]
-        for gpt, deepseek in zip(gpt_messages, deepseek_messages):
-            deepseek_history.append({"role": "user", "content": gpt})
-            deepseek_history.append({"role": "assistant", "content": deepseek})
+        gpt_history.append({"role": "assistant", "content": gpt_next})
+        gpt_history.append({"role": "user", "content": deepseek_next})
+        deepseek_history.append({"role": "assistant", "content": deepseek_next})
         deepseek_history.append({"role": "user", "content": gpt_next})
-        deepseek_next = call_deepseek(deepseek_api_key, deepseek_model, deepseek_system, deepseek_history)
-        deepseek_messages.append(deepseek_next)
+
+        conversation_md.append(f"**GPT:** {gpt_next}")
         conversation_md.append(f"**DeepSeek:** {deepseek_next}")
+        # 每轮结束就把当前记录推给界面，不用等整场辩论跑完
+        yield "\n\n".join(conversation_md)
 
     conversation_md.append("**对话结束!** ✅")
-    return "\n\n".join(conversation_md)
+    yield "\n\n".join(conversation_md)
 
 
 # Gradio 界面
@@ -121,7 +158,9 @@ with gr.Blocks() as demo:
             deepseek_first_statement,
             num_rounds
         ],
-        outputs=output
+        outputs=output,
+        # 请求都在后台事件循环里异步执行，不再限制同时进行的辩论场数
+        concurrency_limit=None
     )
 
 if __name__ == "__main__":
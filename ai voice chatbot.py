@@ -1,44 +1,75 @@
+import itertools
+import json
 import queue
+import re
 import tempfile
 import time
 import os
+import wave
 import numpy as np
 import pygame
 import requests
+import ctranslate2
 import sounddevice as sd
-import soundfile as sf
-import whisper
+import webrtcvad
+from faster_whisper import WhisperModel
 from gtts import gTTS
+try:
+    from piper.voice import PiperVoice  # 需要 piper-tts>=1.3
+except ImportError:
+    PiperVoice = None  # 没装 piper-tts 时只用 gTTS
 import tkinter as tk
 from tkinter import scrolledtext, ttk
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # 配置参数
 SAMPLE_RATE = 16000
 CHUNK_DURATION = 3
+BLOCK_SIZE = int(SAMPLE_RATE * 0.1)  # 录音回调每 100ms 触发一次
 OLLAMA_API_URL = "http://localhost:11434/api/chat"
+OLLAMA_KEEP_ALIVE = "30m"  # 模型常驻时间，避免空闲后重新加载
+OLLAMA_NUM_CTX = 2048  # 上下文窗口，够用即可，避免分配过大的KV缓存
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # 模型路径相对脚本所在目录，而不是当前工作目录
+WHISPER_MODEL_DIR = os.path.join(BASE_DIR, "models", "whisper-tiny-int8")  # 预先转换好的 int8 CTranslate2 模型
+PIPER_VOICE_DIR = os.path.join(BASE_DIR, "voices")  # 本地 Piper 语音模型目录
+TTS_WORKERS = 4  # 同时合成的句子数
+PLAYBACK_END_MARGIN = 1.0  # 播放起步延迟和mp3时长误差的最长等待秒数
+MAX_CLIP_DURATION = 60  # 读不到音频时长时，最多等待播放这么多秒
 
 # 支持的语言
 LANGUAGES = {
     "English": {
         "code": "en",
+        "piper_voice": "en_US-amy-medium.onnx",
         "system_prompt": "You are a friendly English tutor. Respond concisely in under 100 words in English."
     },
     "Deutsch": {
         "code": "de",
+        "piper_voice": "de_DE-thorsten-medium.onnx",
         "system_prompt": "Du bist ein freundlicher Deutschlehrer. Antworte kurz und prägnant in maximal 100 Wörtern auf Deutsch."
     },
     "中文": {
         "code": "zh",
+        "piper_voice": "zh_CN-huayan-medium.onnx",
         "system_prompt": "你是一位友好的中文老师。请用100字以内的中文简洁回答。"
     }
 }
 
 # 语音检测参数
-SILENCE_THRESHOLD = 0.015
+VAD_AGGRESSIVENESS = 2  # webrtcvad 灵敏度，0 最宽松，3 最严格
+VAD_FRAME_SIZE = int(SAMPLE_RATE * 0.01)  # webrtcvad 每帧 10ms
+VAD_SPEECH_RATIO = 0.5  # 一块音频中超过这个比例的帧有人声才算在说话
 MIN_SPEECH_DURATION = 0.3
 MIN_SILENCE_DURATION = 0.8
 PRE_SPEECH_BUFFER = 0.5
+MAX_UTTERANCE_DURATION = 30  # 单次发言最长录音秒数
+
+# 流式回答按句子切分后交给TTS，英文句点后面要跟空白才算句末，避免切开小数
+SENTENCE_PATTERN = re.compile(r".*?(?:[。！？!?]+|\.+(?=\s))", re.S)
+
+# 对话上下文最多保留的轮数（每轮一问一答），系统提示始终保留
+MAX_CONTEXT_TURNS = 8
 
 # 在配置参数部分添加可用模型列表
 AVAILABLE_MODELS = {
@@ -51,43 +82,77 @@ class OllamaClient:
     def __init__(self, model_name="llama3.1"):
         self.model_name = model_name
         self.api_url = OLLAMA_API_URL
+        # 复用连接，语音对话的每一轮不再重新建立连接
+        self.session = requests.Session()
 
     def get_response(self, messages):
+        """一次性获取完整回答，失败时返回None"""
+        response = "".join(self.stream_response(messages))
+        return response or None
+
+    def stream_response(self, messages):
+        """流式获取回答，边生成边逐段返回文本"""
         payload = {
             "model": self.model_name,
             "messages": messages,
-            "stream": False
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                "num_ctx": OLLAMA_NUM_CTX
+            }
         }
 
         try:
-            response = requests.post(
+            with self.session.post(
                 self.api_url,
                 json=payload,
+                stream=True,
                 timeout=30
-            )
-
-            if response.status_code == 200:
-                response_data = response.json()
-                return response_data['message']['content']
-            else:
-                print(f"Ollama API Error {response.status_code}: {response.text}")
-                return None
+            ) as response:
+                if response.status_code != 200:
+                    print(f"Ollama API Error {response.status_code}: {response.text}")
+                    return
+
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    content = chunk.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if chunk.get("done"):
+                        break
 
         except Exception as e:
             print(f"Ollama API Request Failed: {str(e)}")
-            return None
 
 
 class VoiceChatbot:
     def __init__(self, root=None, model_name="llama3.1"):  # 默认改为 llama3.1
-        # 初始化语音模型
-        self.whisper_model = whisper.load_model("tiny")  # 使用更小的模型提高速度
+        # 初始化语音模型，优先加载本地预先转换好的模型，没有时再下载转换
+        whisper_model = WHISPER_MODEL_DIR if os.path.isdir(WHISPER_MODEL_DIR) else "tiny"
+        # 有GPU时优先用fp16，显卡不支持高效fp16时交给CTranslate2选择，没有GPU时用CPU上更快的int8量化
+        self.whisper_model = None
+        if ctranslate2.get_cuda_device_count() > 0:
+            try:
+                supported_types = ctranslate2.get_supported_compute_types("cuda")
+                compute_type = "float16" if "float16" in supported_types else "default"
+                self.whisper_model = WhisperModel(whisper_model, device="cuda", compute_type=compute_type)
+                self._warm_up_whisper()
+            except Exception as e:
+                # 有显卡但缺少cuBLAS/cuDNN等运行库时退回CPU
+                print(f"CUDA Whisper unavailable: {str(e)}, falling back to CPU")
+                self.whisper_model = None
+        if self.whisper_model is None:
+            self.whisper_model = WhisperModel(whisper_model, device="cpu", compute_type="int8",
+                                              cpu_threads=os.cpu_count())
+            self._warm_up_whisper()
 
         # 初始化Ollama客户端
         self.llm_client = OllamaClient(model_name)
 
         # 音频队列系统
-        self.audio_queue = queue.Queue()
+        self.audio_queue = queue.SimpleQueue()
         self.response_queue = queue.Queue()
 
         # 初始化TTS引擎
@@ -96,6 +161,10 @@ class VoiceChatbot:
         # 当前语言设置
         self.current_language = "English"
 
+        # 本地 Piper 语音模型，按语言代码缓存
+        self._piper_voices = {}
+        self._get_piper_voice(self.current_language)
+
         # 对话上下文管理
         self.context = [
             {"role": "system", "content": LANGUAGES[self.current_language]["system_prompt"]}
@@ -113,14 +182,44 @@ class VoiceChatbot:
 
         # UI组件
         self.root = root
+        self._last_vol_pct = -1  # 上一次显示的音量，音量不变时不重绘
         if self.root:
             self.setup_ui()
 
         # 音量监测变量
         self.current_volume = 0
+        # 预分配回调用的缓冲区，避免在实时音频线程里反复分配内存
+        self._abs_buf = np.empty(BLOCK_SIZE, dtype=np.float32)
+        self._pcm_buf = np.empty(BLOCK_SIZE, dtype=np.int16)
+
+        # 语音活动检测
+        self._vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+
+        # 预分配整段发言的录音缓冲区，按写入位置顺序填充
+        self._utt_buf = np.empty(SAMPLE_RATE * MAX_UTTERANCE_DURATION, dtype=np.float32)
+        self._utt_pos = 0
 
         # 添加新的控制标志
         self.processing_enabled = True
+        self._state_cond = threading.Condition()
+
+        # 识别、回答、朗读三个阶段各用一个线程，通过队列串成流水线
+        self.asr_queue = queue.Queue(maxsize=1)
+        self.llm_queue = queue.Queue(maxsize=1)
+        self.tts_queue = queue.Queue()  # 按顺序排好的语音合成任务
+
+        # 多句回答并行合成，播放仍按原顺序
+        self._tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS)
+        self._tts_file_ids = itertools.count()
+        self._piper_lock = threading.Lock()
+
+        for worker in (self._asr_worker, self._llm_worker, self._tts_worker):
+            threading.Thread(target=worker, daemon=True).start()
+
+    def _warm_up_whisper(self):
+        """用一秒静音预热模型，避免第一句话承担初始化开销"""
+        segments, _ = self.whisper_model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32))
+        list(segments)
 
     def setup_ui(self):
         """设置GUI界面"""
@@ -185,9 +284,12 @@ class VoiceChatbot:
         """更新音量指示器"""
         if self.is_recording:
             volume_percentage = min(100, int(self.current_volume * 100))
-            self.volume_meter["value"] = volume_percentage
         else:
-            self.volume_meter["value"] = 0
+            volume_percentage = 0
+
+        if volume_percentage != self._last_vol_pct:
+            self.volume_meter["value"] = volume_percentage
+            self._last_vol_pct = volume_percentage
 
         self.root.after(100, self.update_volume_meter)
 
@@ -207,12 +309,36 @@ class VoiceChatbot:
         if status:
             print(f"Recording error: {status}")
 
-        volume = np.max(np.abs(indata))
+        abs_buf = self._abs_buf[:frames]
+        np.abs(indata[:, 0], out=abs_buf)
+        volume = float(abs_buf.max())
         self.current_volume = volume * 2
 
-        # 只有在允许处理时才添加到队列
+        # 只有在允许处理时才做人声检测并添加到队列
         if self.processing_enabled and not self.is_playing:
-            self.audio_queue.put((indata.copy(), volume))
+            self.audio_queue.put((indata.copy(), self._is_speech(indata[:, 0])))
+
+    def _is_speech(self, samples):
+        """用webrtcvad按10ms一帧判断这块音频里是否有人声"""
+        # 转成webrtcvad需要的16位PCM，复用预分配的缓冲区
+        scratch = self._abs_buf[:len(samples)]
+        np.clip(samples, -1.0, 1.0, out=scratch)
+        np.multiply(scratch, 32767, out=scratch)
+        pcm = self._pcm_buf[:len(samples)]
+        pcm[:] = scratch
+
+        num_frames = len(pcm) // VAD_FRAME_SIZE
+        if num_frames == 0:
+            return False
+        voiced_frames = sum(
+            self._vad.is_speech(pcm[i * VAD_FRAME_SIZE:(i + 1) * VAD_FRAME_SIZE].tobytes(), SAMPLE_RATE)
+            for i in range(num_frames)
+        )
+        return voiced_frames >= num_frames * VAD_SPEECH_RATIO
+
+    def _clear_audio_queue(self):
+        """清空音频队列，直接换一个新队列，旧队列交给垃圾回收"""
+        self.audio_queue = queue.SimpleQueue()
 
     def start_recording(self):
         """启动录音"""
@@ -227,7 +353,7 @@ class VoiceChatbot:
             samplerate=SAMPLE_RATE,
             channels=1,
             callback=self._recording_callback,
-            blocksize=int(SAMPLE_RATE * 0.1)
+            blocksize=BLOCK_SIZE
         )
         self.recording_stream.start()
 
@@ -248,7 +374,7 @@ class VoiceChatbot:
 
     def process_audio(self):
         """处理音频队列"""
-        accumulated_audio = []
+        self._utt_pos = 0
         accumulated_time = 0
         speech_started = False
         speech_duration = 0
@@ -256,16 +382,17 @@ class VoiceChatbot:
 
         while self.is_recording:
             try:
-                # 只在允许处理时获取音频
-                if not self.processing_enabled:
-                    time.sleep(0.1)
-                    continue
+                # 只在允许处理时获取音频，禁用期间等待状态变化而不是轮询
+                with self._state_cond:
+                    if not self._state_cond.wait_for(
+                            lambda: self.processing_enabled or not self.is_recording, timeout=0.5):
+                        continue
 
-                audio_chunk, volume = self.audio_queue.get(timeout=0.5)
+                audio_chunk, is_speech = self.audio_queue.get(timeout=0.5)
                 chunk_duration = len(audio_chunk) / SAMPLE_RATE
                 accumulated_time += chunk_duration
 
-                if volume > SILENCE_THRESHOLD:
+                if is_speech:
                     if not speech_started and accumulated_time >= PRE_SPEECH_BUFFER:
                         speech_started = True
                         self.speech_detected = True
@@ -277,15 +404,27 @@ class VoiceChatbot:
                     if speech_started:
                         silence_duration += chunk_duration
 
-                accumulated_audio.append(audio_chunk)
+                if self._utt_pos + len(audio_chunk) > len(self._utt_buf) and not speech_started:
+                    # 一直没人说话时只保留最近一小段作为前置缓冲
+                    keep = int(SAMPLE_RATE * PRE_SPEECH_BUFFER)
+                    self._utt_buf[:keep] = self._utt_buf[self._utt_pos - keep:self._utt_pos]
+                    self._utt_pos = keep
+
+                n = min(len(audio_chunk), len(self._utt_buf) - self._utt_pos)
+                self._utt_buf[self._utt_pos:self._utt_pos + n] = audio_chunk[:n, 0]
+                self._utt_pos += n
+                buffer_full = self._utt_pos == len(self._utt_buf)
 
                 should_process = (speech_started and
-                                  speech_duration >= MIN_SPEECH_DURATION and
-                                  silence_duration >= MIN_SILENCE_DURATION)
+                                  (buffer_full or
+                                   (speech_duration >= MIN_SPEECH_DURATION and
+                                    silence_duration >= MIN_SILENCE_DURATION)))
 
                 if should_process:
-                    self.process_accumulated_audio(accumulated_audio)
-                    accumulated_audio = []
+                    # 暂时禁用处理以防止录入AI回答，音频复制一份交给识别线程
+                    self._set_processing(False)
+                    self.asr_queue.put(self._utt_buf[:self._utt_pos].copy())
+                    self._utt_pos = 0
                     accumulated_time = 0
                     speech_started = False
                     speech_duration = 0
@@ -298,86 +437,160 @@ class VoiceChatbot:
                 print(f"Processing Error: {str(e)}")
                 time.sleep(1)
 
-    def process_accumulated_audio(self, audio_chunks):
-        """处理累积的音频数据"""
-        if not audio_chunks or not self.processing_enabled:
-            return
+    def _asr_worker(self):
+        """语音识别线程：把录好的音频转成文字交给LLM线程"""
+        while True:
+            audio_data = self.asr_queue.get()
+            handed_off = False
+            try:
+                # 更新状态为转录中
+                if self.root:
+                    self.status_var.set("你的声音本AI听得一清二楚...")
+
+                # 清空音频队列，防止处理到AI的回答
+                self._clear_audio_queue()
+
+                # 直接把录音缓冲区交给 Whisper，不再写临时 wav 文件
+                segments, info = self.whisper_model.transcribe(
+                    audio_data,
+                    language=LANGUAGES[self.current_language]["code"],
+                    temperature=0.0,
+                    no_speech_threshold=0.3,
+                    vad_filter=True
+                )
+                user_text = "".join(segment.text for segment in segments).strip()
+
+                if user_text:
+                    print(f"\n👤 User: {user_text}")
+                    if self.root:
+                        self.update_chat_display("user", user_text)
 
-        try:
-            # 暂时禁用处理以防止录入AI回答
-            self.processing_enabled = False
+                    self.llm_queue.put(user_text)
+                    handed_off = True
 
-            # 更新状态为转录中
-            if self.root:
-                self.status_var.set("你的声音本AI听得一清二楚...")
-
-            # 使用更快的音频处理
-            audio_data = np.concatenate(audio_chunks)
-            temp_file = os.path.join(self.temp_dir, "temp_audio.wav")
-            sf.write(temp_file, audio_data, SAMPLE_RATE)
-
-            # 清空音频队列，防止处理到AI的回答
-            while not self.audio_queue.empty():
-                self.audio_queue.get_nowait()
-
-            # 添加超时控制
-            result = self.whisper_model.transcribe(
-                temp_file,
-                language=LANGUAGES[self.current_language]["code"],
-                temperature=0.0,
-                no_speech_threshold=0.3
-            )
-            user_text = result["text"].strip()
-
-            if user_text:
-                print(f"\n👤 User: {user_text}")
+            except Exception as e:
+                print(f"Error processing audio: {str(e)}")
                 if self.root:
-                    self.update_chat_display("user", user_text)
-
+                    self.status_var.set(f"Error: {str(e)}")
+            finally:
+                # 没有交给下一步时，这一轮到此结束
+                if not handed_off:
+                    self._finish_turn()
+
+    def _llm_worker(self):
+        """LLM线程：流式获取回答，每凑齐一句就交给TTS线程朗读"""
+        while True:
+            user_text = self.llm_queue.get()
+            try:
                 self.context.append({"role": "user", "content": user_text})
 
-                # 获取AI响应
-                ai_response = self.llm_client.get_response(self.context)
+                if self.root:
+                    self.status_var.set("帅气回答中...")
+                ai_response = ""
+                pending_text = ""
+                for delta in self.llm_client.stream_response(self.context):
+                    ai_response += delta
+                    pending_text += delta
+                    sentence_end = 0
+                    for match in SENTENCE_PATTERN.finditer(pending_text):
+                        # 标点刚好在末尾时先不切，下一段可能还有连着的标点（如"!!"）
+                        if match.end() == len(pending_text):
+                            break
+                        self._speak_sentence(match.group())
+                        sentence_end = match.end()
+                    pending_text = pending_text[sentence_end:]
+                self._speak_sentence(pending_text)
 
                 if ai_response:
                     print(f"\n🤖 AI: {ai_response}")
                     if self.root:
                         self.update_chat_display("assistant", ai_response)
-                        self.status_var.set("帅气回答中...")
 
                     self.context.append({"role": "assistant", "content": ai_response})
+                    self._trim_context()
 
-                    # 文本转语音并播放
-                    self.text_to_speech(ai_response)
+                # 等所有句子播放完再继续听
+                self.tts_queue.join()
+                if ai_response:
+                    time.sleep(0.5)  # 添加短暂延迟
+                    self._clear_audio_queue()
 
-        except Exception as e:
-            print(f"Error processing audio: {str(e)}")
-            if self.root:
-                self.status_var.set(f"Error: {str(e)}")
-        finally:
-            # 重新启用处理
-            self.processing_enabled = True
-            # 恢复录音状态显示
-            if self.root and self.is_recording:
-                self.status_var.set("正在认真听你说呢...")
+            except Exception as e:
+                print(f"LLM Error: {str(e)}")
+                if self.root:
+                    self.status_var.set(f"Error: {str(e)}")
+            finally:
+                self._finish_turn()
+
+    def _set_processing(self, enabled):
+        """修改录音处理开关并唤醒等待中的录音处理线程"""
+        with self._state_cond:
+            self.processing_enabled = enabled
+            self._state_cond.notify_all()
+
+    def _finish_turn(self):
+        """一轮对话结束，重新开始听用户说话"""
+        self._set_processing(True)
+        # 恢复录音状态显示
+        if self.root and self.is_recording:
+            self.status_var.set("正在认真听你说呢...")
+
+    def _speak_sentence(self, sentence):
+        """朗读一句话，只有标点没有文字的片段直接跳过"""
+        sentence = sentence.strip()
+        if re.search(r"\w", sentence):
+            self.text_to_speech(sentence)
+
+    def _tts_worker(self):
+        """TTS线程：按顺序播放合成好的句子"""
+        while True:
+            future = self.tts_queue.get()
+            try:
+                self._play_audio(future)
+            finally:
+                self.tts_queue.task_done()
 
     def text_to_speech(self, text):
-        """文本转语音"""
+        """提交一句话的语音合成任务，合成在线程池里并行进行，播放由TTS线程按顺序完成"""
+        future = self._tts_pool.submit(self._synthesize, text, self.current_language)
+        self.tts_queue.put(future)
+
+    def _synthesize(self, text, language):
+        """把一句话合成为音频文件，返回文件路径"""
+        file_id = next(self._tts_file_ids)
+        voice = self._get_piper_voice(language)
+        if voice:
+            # 使用本地Piper生成语音，不走网络
+            response_file = os.path.join(self.temp_dir, f"response_{file_id}.wav")
+            try:
+                with self._piper_lock, wave.open(response_file, "wb") as wav_file:
+                    voice.synthesize_wav(text, wav_file)
+                return response_file
+            except Exception as e:
+                print(f"Piper TTS Error: {str(e)}, falling back to gTTS")
+                # 删除写了一半的wav文件
+                try:
+                    os.remove(response_file)
+                except OSError:
+                    pass
+
+        # 没有本地语音模型或Piper合成失败时退回gTTS
+        response_file = os.path.join(self.temp_dir, f"response_{file_id}.mp3")
+        tts = gTTS(text=text, lang=LANGUAGES[language]["code"], slow=False)
+        tts.save(response_file)
+        return response_file
+
+    def _play_audio(self, future):
+        """等待合成结果并播放，调用方负责在朗读期间禁用录音处理"""
+        response_file = None
         try:
-            # 确保处理被禁用
-            self.processing_enabled = False
-
-            if self.root:
+            if self.root and not future.done():
                 self.status_var.set("夜以继日地加工语料...")
 
             # 清空音频队列
-            while not self.audio_queue.empty():
-                self.audio_queue.get_nowait()
+            self._clear_audio_queue()
 
-            # 使用gTTS生成语音
-            response_file = os.path.join(self.temp_dir, "response.mp3")
-            tts = gTTS(text=text, lang=LANGUAGES[self.current_language]["code"], slow=False)
-            tts.save(response_file)
+            response_file = future.result()
 
             self.is_playing = True
 
@@ -385,19 +598,23 @@ class VoiceChatbot:
                 self.status_var.set("AI正在帅气回答...")
 
             # 播放音频
+            duration = self._audio_duration(response_file)
             pygame.mixer.music.load(response_file)
             pygame.mixer.music.play()
 
-            # 等待播放完成
-            while pygame.mixer.music.get_busy():
-                pygame.time.Clock().tick(10)
-
-            time.sleep(0.5)  # 添加短暂延迟
+            # 先按音频时长等待，再短暂确认播放真正结束，避免截掉句尾
+            # 读不到时长时只靠播放状态判断，并限制最长等待时间
+            if duration:
+                time.sleep(duration)
+                deadline = time.monotonic() + PLAYBACK_END_MARGIN
+            else:
+                deadline = time.monotonic() + MAX_CLIP_DURATION
+            while pygame.mixer.music.get_busy() and time.monotonic() < deadline:
+                time.sleep(0.05)
             self.is_playing = False
 
             # 再次清空音频队列
-            while not self.audio_queue.empty():
-                self.audio_queue.get_nowait()
+            self._clear_audio_queue()
 
         except Exception as e:
             print(f"TTS Error: {str(e)}")
@@ -405,11 +622,49 @@ class VoiceChatbot:
                 self.status_var.set(f"TTS Error: {str(e)}")
         finally:
             self.is_playing = False
-            # 重新启用处理
-            self.processing_enabled = True
-            # 恢复录音状态显示
-            if self.root and self.is_recording:
-                self.status_var.set("正在认真听你说呢...")
+            # 播放完删除临时音频文件
+            if response_file:
+                try:
+                    pygame.mixer.music.unload()
+                    os.remove(response_file)
+                except Exception:
+                    pass
+
+    def _audio_duration(self, path):
+        """获取音频时长（秒），读不到时返回None"""
+        try:
+            if path.endswith(".wav"):
+                with wave.open(path, "rb") as wav_file:
+                    return wav_file.getnframes() / wav_file.getframerate()
+            # mp3交给pygame解码，和播放用的是同一套解码器
+            return pygame.mixer.Sound(path).get_length()
+        except Exception as e:
+            print(f"Could not read audio duration: {str(e)}")
+            return None
+
+    def _trim_context(self):
+        """只保留系统提示和最近几轮对话，避免每次请求都重新处理全部历史"""
+        if len(self.context) > 2 * MAX_CONTEXT_TURNS + 1:
+            self.context = self.context[:1] + self.context[-2 * MAX_CONTEXT_TURNS:]
+
+    def _get_piper_voice(self, language):
+        """获取Piper语音模型，没装piper-tts、缺少模型文件或加载失败时返回None"""
+        if PiperVoice is None:
+            return None
+        code = LANGUAGES[language]["code"]
+        if code not in self._piper_voices:
+            model_path = os.path.join(PIPER_VOICE_DIR, LANGUAGES[language]["piper_voice"])
+            config_path = f"{model_path}.json"
+            voice = None
+            if not (os.path.exists(model_path) and os.path.exists(config_path)):
+                print(f"Piper voice not found: {model_path} (.onnx/.onnx.json), falling back to gTTS")
+            else:
+                try:
+                    voice = PiperVoice.load(model_path)
+                except Exception as e:
+                    print(f"Piper voice failed to load: {model_path}: {str(e)}, falling back to gTTS")
+            self._piper_voices[code] = voice
+        return self._piper_voices[code]
 
     def update_chat_display(self, speaker, text):
         """更新聊天显示"""
@@ -434,6 +689,8 @@ class VoiceChatbot:
         new_language = self.language_var.get()
         if new_language != self.current_language:
             self.current_language = new_language
+            # 提前加载新语言的语音模型
+            self._get_piper_voice(new_language)
             # 更新系统提示
             self.context = [
                 {"role": "system", "content": LANGUAGES[self.current_language]["system_prompt"]}